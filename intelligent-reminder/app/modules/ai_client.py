@@ -1,7 +1,32 @@
+from typing import Optional
+from twilio.http.async_http_client import AsyncTwilioHttpClient
+from twilio.request_validator import RequestValidator
 from twilio.rest import Client
 from config import settings
 
-twilio_client = Client(
-    settings.twilio_account_sid,
-    settings.twilio_auth_token
-)
\ No newline at end of file
+# Twilio REST client on a shared aiohttp session, so placing a call never blocks the
+# event loop. The session binds to the running loop, so it is opened in the app lifespan.
+twilio_client: Optional[Client] = None
+
+
+async def start_twilio_client():
+    """Opens the shared async Twilio client"""
+    global twilio_client
+    twilio_client = Client(
+        settings.twilio_account_sid,
+        settings.twilio_auth_token,
+        # No automatic retries: a retried POST after a 5xx could place the same call twice
+        http_client=AsyncTwilioHttpClient(),
+    )
+
+
+async def close_twilio_client():
+    """Closes the shared async Twilio client"""
+    global twilio_client
+    if twilio_client:
+        await twilio_client.http_client.close()
+        twilio_client = None
+
+
+# Verifies the X-Twilio-Signature header on incoming webhooks
+twilio_request_validator = RequestValidator(settings.twilio_auth_token)
\ No newline at end of file
@@ -1,15 +1,45 @@
 from fastapi import APIRouter, BackgroundTasks, status, Request, Response, HTTPException, Query, WebSocket
+from fastapi.responses import FileResponse, StreamingResponse
 from app.modules.models import CallRequest
 from app.modules.services import ReminderService
+from app.modules.ai_client import twilio_request_validator
 from logger import logger
-from typing import Dict
+from typing import Dict, List
+from string import Template
+from xml.sax.saxutils import quoteattr
 import json
+import logging
+import os
 import asyncio
+import orjson
 import websockets
 import websockets.exceptions
 
 router = APIRouter()
 
+# Parameter values are substituted already quoted by quoteattr
+TWIML_TEMPLATE = Template("""<?xml version="1.0" encoding="UTF-8"?>
+    <Response>
+        <Connect>
+            <Stream url=$stream_url>
+                <Parameter name="first_message" value=$first_message />
+                <Parameter name="time" value=$time />
+                <Parameter name="calling_to" value=$calling_to />
+                <Parameter name="prompt" value=$prompt />
+                <Parameter name="phone_number" value=$phone_number />
+                <Parameter name="agent_id" value=$agent_id />
+            </Stream>
+        </Connect>
+    </Response>""")
+
+async def _is_signed_by_twilio(request: Request) -> bool:
+    """Checks the X-Twilio-Signature header of a Twilio webhook request"""
+    form_data = await request.form()
+    signature = request.headers.get("X-Twilio-Signature", "")
+    # Webhook URLs are registered as https, which a TLS-terminating proxy hides from us
+    webhook_url = str(request.url.replace(scheme="https"))
+    return twilio_request_validator.validate(webhook_url, form_data, signature)
+
 @router.post("/calls", status_code=status.HTTP_201_CREATED)
 async def create_call(
     call_request: CallRequest,
@@ -19,6 +49,16 @@ async def create_call(
     host = request.headers.get("host")
     background_tasks.add_task(ReminderService.create_call, call_request, host)
     return {"message": "Reminder task created successfully"}
+
+@router.post("/calls/bulk", status_code=status.HTTP_201_CREATED)
+async def create_calls(
+    call_requests: List[CallRequest],
+    background_tasks: BackgroundTasks,
+    request: Request
+):
+    host = request.headers.get("host")
+    background_tasks.add_task(ReminderService.create_calls, call_requests, host)
+    return {"message": f"{len(call_requests)} reminder tasks created successfully"}
     
 @router.get("/aicalling/records/{country_code}/{agent_id}/{date}")
 async def get_ai_calling_records(country_code: str, date: str, agent_id: str) -> list:
@@ -30,7 +70,7 @@ async def get_ai_calling_records(country_code: str, date: str, agent_id: str) ->
     """
     try:
         stream_service = ReminderService()
-        records = stream_service.get_ai_calling_records_service(country_code, date, agent_id)
+        records = await asyncio.to_thread(stream_service.get_ai_calling_records_service, date, agent_id)
         return records
     except Exception as error:
         logger.error("Error fetching AI calling records: %s", error)
@@ -40,30 +80,32 @@ async def get_ai_calling_records(country_code: str, date: str, agent_id: str) ->
 async def outbound_call_status(request: Request):
     try:
         # Log the raw request details for debugging
-        logger.info("Received callback request from Twilio")
-        logger.info("Headers: %s", dict(request.headers))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Callback headers: %s", dict(request.headers))
         
         # Get agent_id from query parameters
         agent_id = request.query_params.get("agent_id")
-        logger.info("Agent ID from query params: %s", agent_id)
         
         # Parse the form data from Twilio's request
         form_data = await request.form()
-        logger.info("Form data: %s", dict(form_data))
-        
+
+        # Reject callbacks not signed by Twilio before doing any work
+        if not await _is_signed_by_twilio(request):
+            logger.warning("Rejected call status callback with an invalid Twilio signature")
+            return Response(status_code=403)
+
         to_number = form_data.get("To")
         status = form_data.get("CallStatus")
         country_code = form_data.get("ToCountry")
-        logger.info("Country code from callback: %s", country_code)
         
-        if not to_number or not status or not country_code:
+        if not all((to_number, status, country_code)):
             logger.error(
                 "Missing required parameters: To=%s, CallStatus=%s, ToCountry=%s", 
                 to_number, status, country_code
             )
             return Response(status_code=400, content="Missing required parameters")
             
-        logger.info("Call status update for %s: %s", to_number, status)
+        logger.info("Call status callback for %s (agent %s, %s): %s", to_number, agent_id, country_code, status)
         stream_service = ReminderService()
         
         await stream_service.handle_call_status(to_number, status, agent_id)
@@ -85,17 +127,19 @@ async def download_ai_calling_records(date: str, agent_id: str) -> Response:
     """
     try:
         stream_service = ReminderService()
-        csv_path = stream_service.generate_calls_csv(date, agent_id)
-        
-        # Read the CSV file
-        with open(csv_path, "rb") as filename:
-            csv_content = filename.read()
-            
-        # Return CSV file as response
-        return Response(
-            content=csv_content,
+        csv_path = await asyncio.to_thread(stream_service.get_cached_calls_report, date, agent_id)
+
+        # Settled days are served from the report cache
+        if csv_path:
+            return FileResponse(csv_path, media_type="text/csv", filename=os.path.basename(csv_path))
+
+        # Records that can still change are streamed as they are read. The first page is
+        # fetched up front so a failing query still gets a 500 before the body starts.
+        first_page, pages = await stream_service.fetch_report_pages(date, agent_id)
+        return StreamingResponse(
+            stream_service.stream_calls_csv(date, agent_id, first_page, pages),
             media_type="text/csv",
-            headers={"Content-Disposition": f'attachment; filename="{csv_path}"'},
+            headers={"Content-Disposition": f'attachment; filename="ai_calls_{date}.csv"'},
         )
     except Exception as error:
         logger.error("Error generating CSV file: %s", error)
@@ -122,50 +166,41 @@ async def update_recent_records(background_tasks: BackgroundTasks) -> Dict:
 @router.post("/outbound-call-twiml")
 async def initiate_call(
     request: Request,
-    first_message: str = Query(...),
-    time: str = Query(...),
-    calling_to: str = Query(...),
-    prompt: str = Query(...),
-    phone_number: str = Query(...),
-    agent_id: str = Query(...)
+    cid: str = Query(...)
 ) -> Response:
     """
     Generate TwiML response for initiating an outbound call.
 
     Args:
         request: FastAPI request object
-        prompt: The conversation prompt
-        first_message: Initial message to be spoken
-        agent_id: ID of the AI agent
-        to_number: Recipient's phone number
-        country_code: Country code for the call
+        cid: ID the call's TwiML parameters were stored under when it was placed
 
     Returns:
         Response containing TwiML instructions
     """
-    logger.info(f"Received parameters: first_message=%s, time=%s, calling_to=%s, prompt=%s, phone_number=%s, agent_id=%s",
-                first_message, time, calling_to, prompt, phone_number, agent_id)
-    
-    logger.info("base_url: %s", request.base_url)
+    logger.debug("base_url: %s", request.base_url)
 
-    if not all([first_message, time, prompt, calling_to, phone_number, agent_id]):
+    # The response carries the stored prompt, so only Twilio may fetch it
+    if not await _is_signed_by_twilio(request):
+        logger.warning("Rejected TwiML request with an invalid Twilio signature")
+        return Response(status_code=403)
+
+    # The prompt and first message are too large for the webhook URL; read them by call id
+    params = await ReminderService.get_twiml_params(cid)
+    if not params:
+        raise HTTPException(status_code=404, detail="Call parameters not found")
+    logger.info("TwiML requested for %s (agent %s)", params.get("calling_to"), params.get("agent_id"))
+    logger.debug("Received parameters: %s", params)
+
+    fields = ("first_message", "time", "calling_to", "prompt", "phone_number", "agent_id")
+    if not all(params.get(field) for field in fields):
         raise HTTPException(status_code=422, detail="Missing required parameters")
 
-    twiml_response = f"""<?xml version="1.0" encoding="UTF-8"?>
-    <Response>
-        <Connect>
-            <Stream url="wss://{request.base_url.hostname}/outbound-media-stream">
-                <Parameter name="first_message" value="{first_message}" />
-                <Parameter name="time" value="{time}" />
-                <Parameter name="calling_to" value="{calling_to}" />
-                <Parameter name="prompt" value="{prompt}" />
-                <Parameter name="phone_number" value="{phone_number}" />
-                <Parameter name="agent_id" value="{agent_id}" />
-            </Stream>
-        </Connect>
-    </Response>"""
+    twiml_response = TWIML_TEMPLATE.substitute(
+        stream_url=quoteattr(f"wss://{request.base_url.hostname}/outbound-media-stream"),
+        **{field: quoteattr(params[field]) for field in fields},
+    )
 
-    logger.info("Generated TwiML response: %s", twiml_response)
     return Response(content=twiml_response, media_type="application/xml")
 
 @router.websocket("/outbound-media-stream")
@@ -179,8 +214,7 @@ async def outbound_media_stream(websocket: WebSocket):
     try:
         async for message in websocket.iter_text():
             try:
-                msg = json.loads(message)
-                logger.info("[Twilio] Received message: %s", msg)
+                msg = orjson.loads(message)
 
                 if msg["event"] == "start":
                     stream_sid = msg["start"]["streamSid"]
@@ -193,7 +227,6 @@ async def outbound_media_stream(websocket: WebSocket):
                         stream_sid=stream_sid
                     )
                     await stream_service.setup_connection(custom_parameters)
-                    asyncio.create_task(stream_service.keep_alive())
 
                 elif msg["event"] == "media" and stream_service:
                     await stream_service.handle_media(msg["media"]["payload"])
@@ -233,4 +266,15 @@ async def get_elevenlabs_agents() -> dict:
         return {"success": True, "agents": agents}
     except Exception as error:
         logger.error("Error fetching ElevenLabs agents: %s", error)
-        raise HTTPException(status_code=500, detail="Failed to fetch agents") from error
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Failed to fetch agents") from error
+
+@router.post("/aicalling/agents/invalidate")
+async def invalidate_elevenlabs_agents() -> Dict:
+    """
+    Drop the cached list of ElevenLabs agents, e.g. after agents are updated upstream.
+
+    Returns:
+        dict: Message indicating the cache has been cleared
+    """
+    ReminderService.invalidate_elevenlabs_agents_cache()
+    return {"success": True, "message": "Agents cache invalidated"}
\ No newline at end of file
@@ -5,4 +5,22 @@ CALL_STATUS = {
     "invalid_number": "invalid_number",
     "call_complete": "call_complete",
     "call_failed": "call_failed"
-}
\ No newline at end of file
+}
+
+# Attributes returned when listing a day's call records; the long prompt is left out
+CALL_RECORD_FIELDS = (
+    "SK",
+    "stage",
+    "conversation_id",
+    "created_at_utc",
+    "time",
+    "medicine_taken",
+    "blood_glucose_level",
+    "systolic_blood_pressure",
+    "diastolic_blood_pressure",
+    "call_successful"
+)
+
+# CSV reports for settled days are cached on disk, one file per agent and day
+REPORTS_CACHE_DIR = "/tmp/reports"
+REPORT_CACHE_FILENAME = "{agent_id}_{date}.csv"
@@ -1,28 +1,89 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from datetime import datetime, timedelta, timezone
+from cachetools import TTLCache, cached
+from cachetools.keys import hashkey
 from config import settings
 from logger import logger
+from aws_client import dynamodb
+from app.modules.constants import CALL_RECORD_FIELDS, REPORT_CACHE_FILENAME, REPORTS_CACHE_DIR
+
+# UpdateItem has no batch form, so criteria updates are fanned out over a worker pool
+CRITERIA_UPDATE_WORKERS = 20
+_criteria_update_pool = ThreadPoolExecutor(
+    max_workers=CRITERIA_UPDATE_WORKERS, thread_name_prefix="criteria-update"
+)
+
+# How long the TwiML parameters of a placed call are kept, via the table's TTL attribute
+TWIML_PARAMS_TTL = timedelta(days=1)
+
+# Short-lived cache of per-day call records, keyed on (date, agent_id, fields).
+# Repository methods run in worker threads, so access is guarded by a lock.
+_calls_by_date_cache = TTLCache(maxsize=1024, ttl=60)
+_calls_by_date_lock = threading.Lock()
+
+
+# conversation_id -> (PK, SK), so criteria updates can skip the GSI lookup.
+# A conversation id belongs to one call item for its whole lifetime.
+_conversation_key_cache = TTLCache(maxsize=10_000, ttl=3600)
+_conversation_key_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1024)
+def _partition_key(agent_id: str, date: str) -> str:
+    return f"AICalling#{agent_id}#{date}"
+
+
+def _twiml_params_key(call_id: str) -> dict:
+    return {"PK": f"TwiML#{call_id}", "SK": f"TwiML#{call_id}"}
+
+
+def _invalidate_calls_by_date(date: str, agent_id: str):
+    with _calls_by_date_lock:
+        stale_keys = [key for key in _calls_by_date_cache if key[:2] == (date, agent_id)]
+        for key in stale_keys:
+            _calls_by_date_cache.pop(key, None)
+
+    # A cached CSV report for the day no longer matches its records; the next download regenerates it
+    try:
+        os.remove(os.path.join(REPORTS_CACHE_DIR, REPORT_CACHE_FILENAME.format(agent_id=agent_id, date=date)))
+    except FileNotFoundError:
+        pass
+
+
+def _remember_conversation_key(conversation_id: str, pk: str, sk: str):
+    with _conversation_key_lock:
+        _conversation_key_cache[conversation_id] = (pk, sk)
+
+
+def _lookup_conversation_key(conversation_id: str):
+    with _conversation_key_lock:
+        return _conversation_key_cache.get(conversation_id)
+
+
+def _forget_conversation_key(conversation_id: str):
+    with _conversation_key_lock:
+        _conversation_key_cache.pop(conversation_id, None)
+
 
 class CallRepository:
     gsi1_name = "ConversationIdIndex"
+    gsi2_name = "RecentByTimeIndex"
     
     def __init__(self, dynamodb_client):
         self.dynamodb = dynamodb_client
         self.table_name = settings.dynamodb_table
         self.table = dynamodb_client.Table(settings.dynamodb_table)
 
-    def create_ai_call_item(self, time, calling_to, prompt, agent_id, status):
-        logger.info(
-            "Creating AI call item - Time: %s, Calling to: %s, Prompt: %s, Agent ID: %s, Status: %s",
-            time,
-            calling_to,
-            prompt,
-            agent_id,
-            status
-        )
-        
-        created_at = datetime.now(timezone.utc).isoformat()
-        current_date = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-        partition_key = f"AICalling#{agent_id}#{current_date}"
+    def _build_ai_call_item(self, time, calling_to, prompt, agent_id, status):
+        """Build a new AI call item, returning it along with its partition date"""
+        now = datetime.now(timezone.utc)
+        created_at = now.isoformat()
+        current_date = now.strftime("%Y-%m-%d")
+        partition_key = _partition_key(agent_id, current_date)
+        time_bucket = now.strftime("%Y-%m-%d-%H")
         
         item = {
             "PK": partition_key,
@@ -32,12 +93,66 @@ class CallRepository:
             "created_at_utc": created_at,
             "prompt": prompt,
             "time": time,
-            "GSI1PK": "nil"
+            "GSI1PK": "nil",
+            "GSI2PK": f"AICalling#{time_bucket}",
+            "GSI2SK": created_at
         }
+        return item, current_date
+
+    def create_ai_call_item(self, time, calling_to, prompt, agent_id, status):
+        logger.info(
+            "Creating AI call item - Time: %s, Calling to: %s, Prompt: %s, Agent ID: %s, Status: %s",
+            time,
+            calling_to,
+            prompt,
+            agent_id,
+            status
+        )
+        
+        item, current_date = self._build_ai_call_item(time, calling_to, prompt, agent_id, status)
         
         self.table.put_item(Item=item)
+        _invalidate_calls_by_date(current_date, agent_id)
         logger.info("Created bank statement item in db: %s", item)
 
+    def bulk_create_ai_call_items(self, calls: list):
+        """
+        Create several AI call items with batched writes
+        Args:
+            calls: List of dicts holding create_ai_call_item arguments
+        """
+        logger.info("Creating %d AI call items in bulk", len(calls))
+
+        written_days = set()
+        # batch_writer groups puts into 25-item BatchWriteItem requests and resends unprocessed items
+        with self.table.batch_writer(overwrite_by_pkeys=["PK", "SK"]) as batch:
+            for call in calls:
+                item, current_date = self._build_ai_call_item(**call)
+                batch.put_item(Item=item)
+                written_days.add((current_date, call["agent_id"]))
+
+        for current_date, agent_id in written_days:
+            _invalidate_calls_by_date(current_date, agent_id)
+        logger.info("Created %d AI call items in db", len(calls))
+
+    def create_twiml_params(self, params_by_call_id: dict):
+        """
+        Store the TwiML parameters of placed calls, one item per call id
+        Args:
+            params_by_call_id: Mapping of call id to the parameters its TwiML is built from
+        """
+        # Twilio fetches the TwiML once, when the call connects; DynamoDB TTL removes the rest
+        expires_at = int((datetime.now(timezone.utc) + TWIML_PARAMS_TTL).timestamp())
+        with self.table.batch_writer() as batch:
+            for call_id, params in params_by_call_id.items():
+                batch.put_item(Item={**_twiml_params_key(call_id), **params, "expires_at": expires_at})
+        logger.info("Stored TwiML parameters for %d calls", len(params_by_call_id))
+
+    def get_twiml_params(self, call_id: str):
+        """Retrieve the TwiML parameters stored for a call id"""
+        response = self.table.get_item(Key=_twiml_params_key(call_id))
+        return response.get("Item")
+
     def update_ai_call_item(self, destination_number, agent_id, updates: dict):
         logger.info(
             "Updating AI call item for number: %s with agent_id: %s and updates: %s",
@@ -47,7 +162,8 @@ class CallRepository:
         )
 
         # Create the partition key
-        partition_key = f"AICalling#{agent_id}#{datetime.now(timezone.utc).strftime('%Y-%m-%d')}"
+        current_date = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+        partition_key = _partition_key(agent_id, current_date)
         
         # Correct key structure
         key = {
@@ -80,21 +196,39 @@ class CallRepository:
             ExpressionAttributeValues=expression_values,
             ExpressionAttributeNames=expression_names,
         )
+        _invalidate_calls_by_date(current_date, agent_id)
+        if "conversation_id" in updates:
+            _remember_conversation_key(updates["conversation_id"], partition_key, destination_number)
 
         logger.info("DynamoDB update_item response: %s", response)
         logger.info("Updated AI call item in db with values: %s", updates)
 
+    def _query_pages(self, **query_kwargs):
+        """Yield each page of items matching a query, following LastEvaluatedKey"""
+        while True:
+            response = self.table.query(**query_kwargs)
+            yield response.get("Items", [])
+            last_evaluated_key = response.get("LastEvaluatedKey")
+            if not last_evaluated_key:
+                break
+            query_kwargs["ExclusiveStartKey"] = last_evaluated_key
+
+    def _query_all(self, **query_kwargs):
+        """Yield every item matching a query across all pages"""
+        for page in self._query_pages(**query_kwargs):
+            yield from page
+
     def get_call_by_conversation_id(self, conversation_id):
         """Retrieve a call record using the conversation_id GSI"""
         try:
-            response = self.table.query(
+            items = list(self._query_all(
                 IndexName=self.gsi1_name,
                 KeyConditionExpression="#gsi1pk = :conversation_id",
                 ExpressionAttributeNames={"#gsi1pk": "GSI1PK"},
                 ExpressionAttributeValues={":conversation_id": conversation_id},  # Remove the {"S": ...} wrapper
-            )
-            logger.info("DynamoDB query response for conversation_id %s: %s", conversation_id, response)
-            return response.get("Items", [])
+            ))
+            logger.info("DynamoDB query for conversation_id %s returned %d items", conversation_id, len(items))
+            return items
         except Exception as error:
             logger.error("Error querying by conversation_id: %s", error)
             raise
@@ -107,15 +241,19 @@ class CallRepository:
             updates: Dictionary containing fields and values to update
         """
         try:
-            # First get the record using GSI1PK to get PK and SK
-            items = self.get_call_by_conversation_id(gsi1pk)
+            # Resolve PK and SK from the cache, falling back to the GSI1PK query
+            if cached_key := _lookup_conversation_key(gsi1pk):
+                key_data = {"pk": cached_key[0], "sk": cached_key[1]}
+            else:
+                items = self.get_call_by_conversation_id(gsi1pk)
 
-            if not items:
-                logger.error("No record found for GSI1PK: %s", gsi1pk)
-                return
+                if not items:
+                    logger.error("No record found for GSI1PK: %s", gsi1pk)
+                    return
 
-            # Group key-related data
-            key_data = {"pk": items[0]["PK"], "sk": items[0]["SK"]}
+                # Group key-related data
+                key_data = {"pk": items[0]["PK"], "sk": items[0]["SK"]}
+                _remember_conversation_key(gsi1pk, key_data["pk"], key_data["sk"])
 
             if not key_data["pk"] or not key_data["sk"]:
                 logger.error("Missing PK or SK in record for GSI1PK: %s", gsi1pk)
@@ -128,16 +266,31 @@ class CallRepository:
                 placeholder = f":val{i}"
                 attr_name = f"#attr{i}"
                 expr["parts"].append(f"{attr_name} = {placeholder}")
-                expr["values"][placeholder] = {"S": str(value)}
+                expr["values"][placeholder] = str(value)
                 expr["names"][attr_name] = field
 
+            update_kwargs = {
+                "Key": {"PK": key_data["pk"], "SK": key_data["sk"]},  # Remove the {"S": ...} wrapper
+                "UpdateExpression": "SET " + ", ".join(expr["parts"]),
+                "ExpressionAttributeValues": expr["values"],
+                "ExpressionAttributeNames": expr["names"],
+            }
+            if cached_key:
+                # A key served from the cache was never read from the table; make sure it
+                # still names an existing item rather than letting update_item upsert one
+                update_kwargs["ConditionExpression"] = "attribute_exists(PK)"
+
             # Update the item using PK and SK
-            response = self.table.update_item(
-                Key={"PK": key_data["pk"], "SK": key_data["sk"]},  # Remove the {"S": ...} wrapper
-                UpdateExpression="SET " + ", ".join(expr["parts"]),
-                ExpressionAttributeValues=expr["values"],
-                ExpressionAttributeNames=expr["names"],
-            )
+            try:
+                response = self.table.update_item(**update_kwargs)
+            except self.table.meta.client.exceptions.ConditionalCheckFailedException:
+                logger.warning("Cached key for GSI1PK %s is stale, looking it up again", gsi1pk)
+                _forget_conversation_key(gsi1pk)
+                return self.update_call_criteria_record(gsi1pk, updates)
+
+            # PK is AICalling#<agent_id>#<date>; drop any cached listing for that day
+            prefix, _, call_date = key_data["pk"].rpartition("#")
+            _invalidate_calls_by_date(call_date, prefix.partition("#")[2])
 
             logger.info("Updated record for GSI1PK %s with values: %s", gsi1pk, updates)
             logger.info("DynamoDB update response: %s", response)
@@ -145,35 +298,76 @@ class CallRepository:
             logger.error("Error updating call criteria record: %s", error)
             raise
 
-    def get_calls_by_date(self, date: str, agent_id: str) -> list:
+    def batch_update_call_criteria(self, items):
+        """
+        Update several records by GSI1PK (conversation_id) concurrently
+        Args:
+            items: Iterable of (gsi1pk, updates) tuples
+        Returns:
+            list: The exception raised for each item, or None where the update succeeded
+        """
+        def update(item):
+            try:
+                self.update_call_criteria_record(*item)
+            except Exception as error:
+                return error
+            return None
+
+        results = list(_criteria_update_pool.map(update, items))
+        logger.info("Batch updated criteria for %d records", len(results))
+        return results
+
+    def iter_call_pages_by_date(self, date: str, agent_id: str, fields=CALL_RECORD_FIELDS):
+        """
+        Yield pages of AI calling records for a specific date and agent
+        Args:
+            date: Date in YYYY-MM-DD format
+            agent_id: Agent ID string
+            fields: Attributes to return for each record
+        Yields:
+            Lists of call records, one per DynamoDB page
+        """
+        partition_key = _partition_key(agent_id, date)
+        # Placeholders for every projected attribute, several of which are reserved words
+        projection_names = {f"#f{i}": field for i, field in enumerate(fields)}
+        # The Table resource already deserializes items into Python types
+        yield from self._query_pages(
+            KeyConditionExpression="#pk = :pk",
+            ProjectionExpression=", ".join(projection_names),
+            ExpressionAttributeNames={"#pk": "PK", **projection_names},
+            ExpressionAttributeValues={":pk": partition_key},  # Removed {"S": ...} wrapper
+        )
+
+    def iter_calls_by_date(self, date: str, agent_id: str, fields=CALL_RECORD_FIELDS):
+        """
+        Yield AI calling records for a specific date and agent as each page arrives
+        Args:
+            date: Date in YYYY-MM-DD format
+            agent_id: Agent ID string
+            fields: Attributes to return for each record
+        Yields:
+            Call records
+        """
+        for page in self.iter_call_pages_by_date(date, agent_id, fields):
+            yield from page
+
+    @cached(
+        cache=_calls_by_date_cache,
+        key=lambda self, date, agent_id, fields=CALL_RECORD_FIELDS: hashkey(date, agent_id, tuple(fields)),
+        lock=_calls_by_date_lock,
+    )
+    def get_calls_by_date(self, date: str, agent_id: str, fields=CALL_RECORD_FIELDS) -> list:
         """
         Get all AI calling records for a specific date and agent
         Args:
             date: Date in YYYY-MM-DD format
             agent_id: Agent ID string
+            fields: Attributes to return for each record
         Returns:
             List of call records
         """
         try:
-            partition_key = f"AICalling#{agent_id}#{date}"
-            response = self.table.query(
-                KeyConditionExpression="#pk = :pk",
-                ExpressionAttributeNames={"#pk": "PK"},
-                ExpressionAttributeValues={":pk": partition_key},  # Removed {"S": ...} wrapper
-            )
-
-            # Convert DynamoDB items to regular Python dictionaries
-            items = []
-            for item in response.get("Items", []):
-                converted_item = {}
-                for key, value in item.items():
-                    # If the value is already a primitive type, use it directly
-                    if not isinstance(value, dict):
-                        converted_item[key] = value
-                    else:
-                        # Extract the actual value from DynamoDB type dict
-                        converted_item[key] = next(iter(value.values()))
-                items.append(converted_item)
+            items = list(self.iter_calls_by_date(date, agent_id, fields))
 
             logger.info("Retrieved %d records on date %s", len(items), date)
             return items
@@ -183,41 +377,48 @@ class CallRepository:
             raise
 
     def get_recent_calls(self, minutes: int = 20) -> list:
+        """
+        Get AI calling records created within the last `minutes`
+        Args:
+            minutes: Size of the time window
+        Returns:
+            List of call records
+        """
         # Calculate time window
-        now = datetime.utcnow()
-        twenty_mins_ago = now - timedelta(minutes=minutes)
+        now = datetime.now(timezone.utc)
+        window_start = now - timedelta(minutes=minutes)
+
+        # Timestamps are compared against the ISO strings written at insert
+        start_time = window_start.isoformat()
+        end_time = now.isoformat()
 
-        # Format timestamps as strings without the "+00:00" suffix
-        start_time = twenty_mins_ago.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
-        end_time = now.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        # Hour buckets spanning the window, one GSI query per bucket
+        buckets = []
+        bucket = window_start.replace(minute=0, second=0, microsecond=0)
+        while bucket <= now:
+            buckets.append(f"AICalling#{bucket.strftime('%Y-%m-%d-%H')}")
+            bucket += timedelta(hours=1)
 
         try:
-            response = self.table.scan(
-                FilterExpression="#created_at BETWEEN :start_time AND :end_time",
-                ExpressionAttributeNames={
-                    "#created_at": "created_at_utc"
-                },
-                ExpressionAttributeValues={
-                    ":start_time": start_time,  # Remove the {"S": ...} wrapper
-                    ":end_time": end_time      # Remove the {"S": ...} wrapper
-                }
-            )
-
-            # Convert DynamoDB items to regular Python dictionaries
             items = []
-            for item in response.get("Items", []):
-                converted_item = {}
-                for key, value in item.items():
-                    # Check if the value is a DynamoDB type dict
-                    if isinstance(value, dict):
-                        converted_item[key] = next(iter(value.values()))
-                    else:
-                        # If it's already a primitive value, use it directly
-                        converted_item[key] = value
-                items.append(converted_item)
+            for gsi2pk in buckets:
+                items.extend(self._query_all(
+                    IndexName=self.gsi2_name,
+                    KeyConditionExpression="#gsi2pk = :bucket AND #gsi2sk BETWEEN :start_time AND :end_time",
+                    ExpressionAttributeNames={"#gsi2pk": "GSI2PK", "#gsi2sk": "GSI2SK"},
+                    ExpressionAttributeValues={
+                        ":bucket": gsi2pk,
+                        ":start_time": start_time,
+                        ":end_time": end_time
+                    }
+                ))
 
             return items
 
         except Exception as error:
-            print(f"Error querying recent calls: {str(error)}")
-            raise
\ No newline at end of file
+            logger.error("Error querying recent calls: %s", error)
+            raise
+
+
+# Shared repository; the Table resource is thread-safe for the calls made here
+call_repository = CallRepository(dynamodb)
@@ -1,79 +1,398 @@
 import asyncio
+import csv
+import io
+import os
+import tempfile
+import time
+import uuid
 import websockets
 import json
+import logging
+import orjson
 import base64
 import httpx
-import pandas as pd
-from datetime import datetime
+from cachetools import TTLCache
+from datetime import datetime, timedelta, timezone
 from app.modules.models import CallRequest
-from app.modules.ai_client import twilio_client
+from app.modules import ai_client
 from urllib.parse import urlencode
 from logger import logger
-from typing import List
-from app.modules.repositories import CallRepository
+from typing import List, Optional
+from app.modules.repositories import call_repository
 from config import settings
-from aws_client import dynamodb
-from app.modules.constants import CALL_STATUS
+from app.modules.constants import CALL_STATUS, REPORT_CACHE_FILENAME, REPORTS_CACHE_DIR
+
+# Pooled ElevenLabs REST client shared by all requests. It is opened in the app
+# lifespan so it binds to the running event loop.
+ELEVENLABS_API_URL = "https://api.elevenlabs.io"
+_http: Optional[httpx.AsyncClient] = None
+
+
+async def start_http_client():
+    """Opens the shared ElevenLabs HTTP client"""
+    global _http
+    _http = httpx.AsyncClient(
+        base_url=ELEVENLABS_API_URL,
+        headers={"xi-api-key": settings.elevenlabs_api_key},
+        http2=True,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        timeout=30.0,
+    )
+
+
+async def close_http_client():
+    """Closes the shared ElevenLabs HTTP client"""
+    global _http
+    if _http:
+        await _http.aclose()
+        _http = None
+
+# Upper bound on concurrent analysis refreshes, matching the keep-alive pool size
+ANALYSIS_CONCURRENCY = 20
+
+# Agents rarely change upstream; avoid an ElevenLabs round-trip per dashboard load.
+# Cleared through /aicalling/agents/invalidate when agents are edited upstream.
+_agents_cache = TTLCache(maxsize=4, ttl=300)
+
+# Twilio sends a 20ms μ-law frame per media event; frames are forwarded to
+# ElevenLabs in batches of AUDIO_BATCH_FRAMES. The timer, armed on the first
+# buffered frame, spans a full batch so it only fires once frames stop arriving
+# and trailing audio is never held back.
+AUDIO_BATCH_FRAMES = 6
+AUDIO_FLUSH_DELAY = AUDIO_BATCH_FRAMES * 0.02
+USER_AUDIO_MESSAGE = '{"user_audio_chunk": "%s"}'
+
+# Signed conversation URLs are valid for several minutes; reuse one per agent briefly
+SIGNED_URL_TTL = 45
+
+# CSV reports for settled days are kept on disk and served again on later downloads.
+# A day is settled once the criteria refresh (which looks back a few hours) would
+# normally no longer touch it; any later write to the day's records drops its cached
+# report. Cached reports are purged after REPORTS_CACHE_MAX_AGE.
+REPORT_SETTLE_DELAY = timedelta(hours=4)
+REPORTS_CACHE_MAX_AGE = timedelta(days=30)
+REPORTS_CACHE_PURGE_INTERVAL = 24 * 60 * 60
+
+# Record attributes used by the CSV report, mapped to their column headers
+REPORT_COLUMN_MAPPINGS = {
+    "SK": "Contact Number",
+    "stage": "Call Status",
+    "time": "Time",
+    "medicine_taken": "Medicine Taken",
+    "blood_glucose_level": "Blood Glucose Level",
+    "systolic_blood_pressure": "Systolic BP",
+    "diastolic_blood_pressure": "Diastolic BP"
+}
+REPORT_FIELDS = tuple(REPORT_COLUMN_MAPPINGS)
+REPORT_COLUMNS = [
+    "Date",
+    "Time",
+    "Contact Number",
+    "Call Status",
+    "Medicine Taken",
+    "Blood Glucose Level",
+    "Systolic BP",
+    "Diastolic BP"
+]
+
+# Twilio fires several status callbacks per call; only the latest status per
+# (to_number, agent_id) is kept and written to DynamoDB on the next flush.
+CALL_STATUS_FLUSH_INTERVAL = 0.5
+_pending_call_statuses = {}
+
+
+async def flush_call_statuses():
+    """Writes buffered call status updates to DynamoDB"""
+    if not _pending_call_statuses:
+        return
+
+    batch = dict(_pending_call_statuses)
+    _pending_call_statuses.clear()
+
+    results = await asyncio.gather(
+        *(
+            asyncio.to_thread(call_repository.update_ai_call_item, to_number, agent_id, {"stage": status})
+            for (to_number, agent_id), status in batch.items()
+        ),
+        return_exceptions=True,
+    )
+    for (to_number, agent_id), result in zip(batch, results):
+        if isinstance(result, Exception):
+            logger.error("[Twilio] Error updating call status for %s (agent %s): %s", to_number, agent_id, result)
+
+
+def purge_reports_cache():
+    """Deletes cached CSV reports older than REPORTS_CACHE_MAX_AGE"""
+    if not os.path.isdir(REPORTS_CACHE_DIR):
+        return
+
+    cutoff = time.time() - REPORTS_CACHE_MAX_AGE.total_seconds()
+    for entry in os.scandir(REPORTS_CACHE_DIR):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                logger.info("Purged cached report: %s", entry.path)
+        except OSError as error:
+            logger.error("Error purging cached report %s: %s", entry.path, error)
+
+
+async def run_reports_cache_purge():
+    """Periodically purges old cached CSV reports"""
+    while True:
+        await asyncio.to_thread(purge_reports_cache)
+        await asyncio.sleep(REPORTS_CACHE_PURGE_INTERVAL)
+
+
+async def run_call_status_flusher():
+    """Periodically flushes buffered call status updates"""
+    while True:
+        await asyncio.sleep(CALL_STATUS_FLUSH_INTERVAL)
+        await flush_call_statuses()
 
 class ReminderService:
+    # agent_id -> (signed_url, time.monotonic() when it was fetched)
+    _signed_url_cache = {}
+
     def __init__(self, to_number=None, websocket=None, stream_sid=None):
         self.websocket = websocket
         self.stream_sid = stream_sid
         self.to_number = to_number
         self.eleven_labs_ws = None
         self.eleven_labs_task = None
-        self.call_repository = CallRepository(dynamodb)
+        self.call_repository = call_repository
         self.conversation_id = None
+        self._audio_payloads = []
+        self._audio_flush_handle = None
+        self._audio_flush_task = None
+        # Twilio media envelope for this stream; only the base64 payload, which needs
+        # no JSON escaping, changes between frames
+        self._audio_prefix = '{"event": "media", "streamSid": %s, "media": {"payload": "' % orjson.dumps(stream_sid).decode()
+        self._audio_suffix = '"}}'
+
+    @staticmethod
+    def _prepare_call_request(call_request: CallRequest):
+        """Normalises the destination number and enriches the prompt with the event details"""
+        call_request.calling_to = "+" + str(call_request.calling_to)
+        if call_request.event_type == "Medicine":
+            call_request.prompt = call_request.prompt + ". Calling For: " + call_request.event_type + ", Medicine name: " + call_request.event_name
+        elif call_request.event_type == "Vital":
+            call_request.prompt = call_request.prompt + ". Calling For: " + call_request.event_type + ", Vital name: " + call_request.event_name
+        logger.info("Call request details: %s", call_request.model_dump())
+
+    @staticmethod
+    def _call_item_fields(call_request: CallRequest) -> dict:
+        """Arguments for creating the initial DynamoDB record of a call"""
+        return {
+            "time": call_request.time,
+            "calling_to": call_request.calling_to,
+            "prompt": call_request.prompt,
+            "agent_id": call_request.agent_id,
+            "status": CALL_STATUS["call_initiated"],
+        }
+
+    @staticmethod
+    def _twiml_params(call_request: CallRequest) -> dict:
+        """Parameters the TwiML endpoint passes on to the media stream"""
+        return {
+            "first_message": call_request.first_message,
+            "time": call_request.time,
+            "calling_to": call_request.calling_to,
+            "prompt": call_request.prompt,
+            "phone_number": call_request.phone_number,
+            "agent_id": call_request.agent_id,
+        }
+
+    @staticmethod
+    async def _place_call(call_request: CallRequest, host: str, call_id: str):
+        """Places the outbound call through Twilio"""
+        # Create the callback URL for call status updates
+        status_callback = f"https://{host}/elevenlabs/callback/outbound-call-status"
+
+        # The TwiML endpoint reads the parameters stored under the call id, so the
+        # prompt stays out of the webhook URL
+        encoded_params = urlencode({"cid": call_id})
+
+        # Create outbound call using Twilio
+        call = await ai_client.twilio_client.calls.create_async(
+            to=call_request.calling_to,
+            from_=call_request.phone_number,  # Assuming you have this in your CallRequest model
+            url=f"https://{host}/outbound-call-twiml?{encoded_params}",
+            status_callback=status_callback,
+            status_callback_event=['initiated', 'ringing', 'answered', 'completed']
+        )
+        logger.info("Call created successfully with SID: %s", call.sid)
 
     @staticmethod
     async def create_call(call_request: CallRequest, host: str):
         try:
-            logger.info(f"Creating call for number: {call_request.phone_number}")
-            
-            # Create the callback URL for call status updates
-            status_callback = f"https://{host}/elevenlabs/callback/outbound-call-status"
-
-            call_request.calling_to = "+" + str(call_request.calling_to)
-            if call_request.event_type == "Medicine":
-                call_request.prompt = call_request.prompt + ". Calling For: " + call_request.event_type + ", Medicine name: " + call_request.event_name
-            elif call_request.event_type == "Vital":
-                call_request.prompt = call_request.prompt + ". Calling For: " + call_request.event_type + ", Vital name: " + call_request.event_name
-            logger.info("Call request details: %s", call_request.model_dump())
-            # Convert call_request to dictionary and encode parameters
-            call_params = call_request.model_dump()
-            encoded_params = urlencode(call_params)
-
-            # Create initial record in DynamoDB
-            call_repository = CallRepository(dynamodb)
-            call_repository.create_ai_call_item(
-                time=call_request.time,
-                calling_to=call_request.calling_to,
-                prompt=call_request.prompt,
-                agent_id=call_request.agent_id,
-                status=CALL_STATUS["call_initiated"]
+            logger.info("Creating call for number: %s", call_request.phone_number)
+            ReminderService._prepare_call_request(call_request)
+
+            # Create initial record and TwiML parameters in DynamoDB
+            call_id = uuid.uuid4().hex
+            await asyncio.gather(
+                asyncio.to_thread(
+                    call_repository.create_ai_call_item,
+                    **ReminderService._call_item_fields(call_request)
+                ),
+                asyncio.to_thread(
+                    call_repository.create_twiml_params,
+                    {call_id: ReminderService._twiml_params(call_request)}
+                ),
             )
+
+            await ReminderService._place_call(call_request, host, call_id)
             
-            # Create outbound call using Twilio
-            call = twilio_client.calls.create(
-                to=call_request.calling_to,
-                from_=call_request.phone_number,  # Assuming you have this in your CallRequest model
-                url=f"https://{host}/outbound-call-twiml?{encoded_params}",
-                status_callback=status_callback,
-                status_callback_event=['initiated', 'ringing', 'answered', 'completed']
+        except Exception as e:
+            logger.error("Error creating call: %s", e, exc_info=True)
+            raise
+
+    @staticmethod
+    async def create_calls(call_requests: List[CallRequest], host: str):
+        """
+        Create a batch of reminder calls, writing their initial records in bulk
+
+        Args:
+            call_requests: Calls to place
+            host: Host used to build the Twilio callback URLs
+        """
+        try:
+            logger.info("Creating %d calls", len(call_requests))
+            for call_request in call_requests:
+                ReminderService._prepare_call_request(call_request)
+
+            # Create initial records and TwiML parameters in DynamoDB
+            call_ids = [uuid.uuid4().hex for _ in call_requests]
+            await asyncio.gather(
+                asyncio.to_thread(
+                    call_repository.bulk_create_ai_call_items,
+                    [ReminderService._call_item_fields(call_request) for call_request in call_requests]
+                ),
+                asyncio.to_thread(
+                    call_repository.create_twiml_params,
+                    {
+                        call_id: ReminderService._twiml_params(call_request)
+                        for call_id, call_request in zip(call_ids, call_requests)
+                    }
+                ),
             )
-            logger.info(f"Call created successfully with SID: {call.sid}")
-            
+
+            results = await asyncio.gather(
+                *(
+                    ReminderService._place_call(call_request, host, call_id)
+                    for call_request, call_id in zip(call_requests, call_ids)
+                ),
+                return_exceptions=True,
+            )
+            for call_request, result in zip(call_requests, results):
+                if isinstance(result, Exception):
+                    logger.error("Error creating call to %s: %s", call_request.calling_to, result)
+
         except Exception as e:
-            logger.error(f"Error creating call: {str(e)}", exc_info=True)
+            logger.error("Error creating calls: %s", e, exc_info=True)
+            raise
+
+    @staticmethod
+    async def get_twiml_params(call_id: str) -> Optional[dict]:
+        """Fetches the TwiML parameters stored for a placed call, or None if there are none"""
+        return await asyncio.to_thread(call_repository.get_twiml_params, call_id)
+
+    def get_cached_calls_report(self, date: str, agent_id: str) -> Optional[str]:
+        """
+        Get the cached CSV report for a settled day, generating it on first use
+
+        Args:
+            date: Date in YYYY-MM-DD format
+            agent_id: Agent ID string
+
+        Returns:
+            str: Path to the cached CSV file, or None while the day's records can still change
+        """
+        report_date = datetime.strptime(date, "%Y-%m-%d").date()
+        if report_date >= (datetime.now(timezone.utc) - REPORT_SETTLE_DELAY).date():
+            return None
+
+        cache_path = os.path.join(REPORTS_CACHE_DIR, REPORT_CACHE_FILENAME.format(agent_id=agent_id, date=date))
+        if os.path.exists(cache_path):
+            logger.info("Serving cached report: %s", cache_path)
+            return cache_path
+
+        # Generate next to the cache entry and rename so readers never see a partial file
+        os.makedirs(REPORTS_CACHE_DIR, exist_ok=True)
+        csv_path = self.generate_calls_csv(date, agent_id, output_dir=REPORTS_CACHE_DIR)
+        os.replace(csv_path, cache_path)
+        logger.info("Cached report: %s", cache_path)
+        return cache_path
+
+    @staticmethod
+    def _report_row(date: str, record: dict) -> dict:
+        """Maps a call record to a CSV report row"""
+        return {"Date": date, **{column: record.get(field) for field, column in REPORT_COLUMN_MAPPINGS.items()}}
+
+    @staticmethod
+    async def fetch_report_pages(date: str, agent_id: str):
+        """
+        Start the report query for a specific date and agent
+
+        Args:
+            date: Date in YYYY-MM-DD format
+            agent_id: Agent ID string
+
+        Returns:
+            tuple: The first page of records and an iterator over the remaining pages
+        """
+        pages = call_repository.iter_call_pages_by_date(date, agent_id, fields=REPORT_FIELDS)
+        # Each page is a blocking boto3 query, so fetch it on a worker thread
+        first_page = await asyncio.to_thread(next, pages, [])
+        return first_page, pages
+
+    async def stream_calls_csv(self, date: str, agent_id: str, first_page: list, pages):
+        """
+        Stream a CSV report for a specific date and agent, one DynamoDB page at a time
+
+        Args:
+            date: Date in YYYY-MM-DD format
+            agent_id: Agent ID string
+            first_page: Records already fetched by fetch_report_pages
+            pages: Iterator over the remaining pages
+
+        Yields:
+            str: Chunks of CSV text
+        """
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=REPORT_COLUMNS)
+        writer.writeheader()
+        writer.writerows(self._report_row(date, record) for record in first_page)
+
+        row_count = len(first_page)
+        try:
+            while True:
+                chunk = buffer.getvalue()
+                if chunk:
+                    yield chunk
+                    buffer.seek(0)
+                    buffer.truncate()
+
+                page = await asyncio.to_thread(next, pages, None)
+                if page is None:
+                    break
+                writer.writerows(self._report_row(date, record) for record in page)
+                row_count += len(page)
+
+        except Exception as error:
+            logger.error("Error streaming CSV report: %s", error)
             raise
 
-    def generate_calls_csv(self, date: str, agent_id: str) -> str:
+        logger.info("Streamed CSV report for date %s and agent %s with %d records", date, agent_id, row_count)
+
+    def generate_calls_csv(self, date: str, agent_id: str, output_dir: str = "") -> str:
         """
         Generate a CSV file containing AI calling records for a specific date and agent
         
         Args:
             date: Date in YYYY-MM-DD format
             agent_id: Agent ID string
+            output_dir: Directory to write the file to, defaults to the working directory
             
         Returns:
             str: Path to the generated CSV file
@@ -82,78 +401,38 @@ class ReminderService:
             # Validate date format
             datetime.strptime(date, "%Y-%m-%d")
             
-            # Get records from repository
-            call_repository = CallRepository(dynamodb)
-            records = call_repository.get_calls_by_date(date, agent_id)
-            logger.info("Retrieved records: %s", records)
+            # Records are read from the repository page by page while the file is written
+            records = call_repository.iter_calls_by_date(date, agent_id, fields=REPORT_FIELDS)
 
-            if not records:
-                logger.warning(f"No records found for date {date} and agent {agent_id}")
-                records = []
-
-            # Create DataFrame
-            dataframe = pd.DataFrame(records)
-
-            # Define column mappings
-            column_mappings = {
-                "SK": "Contact Number",
-                "stage": "Call Status",
-                "time": "Time",
-                "medicine_taken": "Medicine Taken",
-                "blood_glucose_level": "Blood Glucose Level",
-                "systolic_blood_pressure": "Systolic BP",
-                "diastolic_blood_pressure": "Diastolic BP"
-            }
-
-            # Handle empty DataFrame
-            if dataframe.empty:
-                dataframe = pd.DataFrame(columns=list(column_mappings.values()))
-            else:
-                # First ensure all source columns exist
-                for source_col in column_mappings.keys():
-                    if source_col not in dataframe.columns:
-                        dataframe[source_col] = None
-                
-                # Then rename columns according to mapping
-                dataframe = dataframe.rename(columns=column_mappings)
-
-            # Add date column with proper name
-            dataframe["Date"] = date
-
-            # Select and reorder columns
-            columns = [
-                "Date",
-                "Time",
-                "Contact Number", 
-                "Call Status",
-                "Medicine Taken",
-                "Blood Glucose Level",
-                "Systolic BP",
-                "Diastolic BP"
-            ]
-            
-            # Ensure all final columns exist
-            for col in columns:
-                if col not in dataframe.columns:
-                    dataframe[col] = None
-                    
-            dataframe = dataframe[columns]
+            # Concurrent downloads may generate the same report, so each gets its own file
+            fd, filename = tempfile.mkstemp(
+                prefix=f"ai_calls_{agent_id}_{date}_", suffix=".csv", dir=output_dir or "."
+            )
 
-            # Generate filename with timestamp
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"ai_calls_{date}_{timestamp}.csv"
+            # Write to CSV, renaming record attributes to report columns
+            row_count = 0
+            try:
+                with open(fd, "w", newline="", buffering=1 << 20) as csv_file:
+                    writer = csv.DictWriter(csv_file, fieldnames=REPORT_COLUMNS)
+                    writer.writeheader()
+                    for record in records:
+                        writer.writerow(self._report_row(date, record))
+                        row_count += 1
+            except BaseException:
+                os.remove(filename)
+                raise
 
-            # Write to CSV
-            dataframe.to_csv(filename, index=False)
+            if not row_count:
+                logger.warning("No records found for date %s and agent %s", date, agent_id)
 
-            logger.info(f"Generated CSV file: {filename}")
+            logger.info("Generated CSV file: %s with %s records", filename, row_count)
             return filename
 
         except ValueError as ve:
-            logger.error(f"Invalid date format: {str(ve)}")
+            logger.error("Invalid date format: %s", ve)
             raise
         except Exception as error:
-            logger.error(f"Error generating CSV file: {str(error)}")
+            logger.error("Error generating CSV file: %s", error)
             raise
 
     def get_ai_calling_records_service(self, date: str, agent_id: str) -> List:
@@ -164,7 +443,6 @@ class ReminderService:
             List of call records
         """
         try:
-            call_repository = CallRepository(dynamodb)
             records = call_repository.get_calls_by_date(date, agent_id)
             logger.info("Retrieved %d records on date %s", len(records), date)
             return records
@@ -187,22 +465,14 @@ class ReminderService:
 
     async def _process_message(self, message):
         """Process individual messages from ElevenLabs"""
-        logger.info("[ElevenLabs] Raw message received: %s", message)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[ElevenLabs] Raw message received: %s", message)
         try:
-            msg = json.loads(message)
-            logger.info("[ElevenLabs] Received message type: %s", msg.get("type"))
-
-            handlers = {
-                "audio": self._handle_audio_message,
-                "interruption": self._handle_interruption,
-                "ping": self._handle_ping,
-                "error": self._handle_error,
-                "conversation_started": self._handle_conversation_started,
-            }
+            msg = orjson.loads(message)
 
-            handler = handlers.get(msg["type"])
+            handler = self._HANDLERS.get(msg["type"])
             if handler:
-                await handler(msg)
+                await handler(self, msg)
 
         except json.JSONDecodeError as error:
             logger.error("[ElevenLabs] Failed to parse message as JSON: %s", error)
@@ -218,10 +488,9 @@ class ReminderService:
                 logger.error("[ElevenLabs] No audio payload found in message")
                 return
 
-            logger.info("[ElevenLabs] Successfully extracted audio payload")
-            audio_data = {"event": "media", "streamSid": self.stream_sid, "media": {"payload": audio_payload}}
-            await self.websocket.send_text(json.dumps(audio_data))
-            logger.info("[ElevenLabs] Successfully sent audio to Twilio")
+            logger.debug("[ElevenLabs] Successfully extracted audio payload")
+            await self.websocket.send_text(self._audio_prefix + audio_payload + self._audio_suffix)
+            logger.debug("[ElevenLabs] Successfully sent audio to Twilio")
 
         except (KeyError, json.JSONDecodeError) as error:
             logger.error("[ElevenLabs] Error processing audio message data: %s", error)
@@ -232,12 +501,14 @@ class ReminderService:
 
     async def _handle_interruption(self, msg):
         """Handle interruption messages"""
-        await self.websocket.send_text(json.dumps({"event": "clear", "streamId": self.stream_sid}))
+        await self.websocket.send_text(orjson.dumps({"event": "clear", "streamId": self.stream_sid}).decode())
 
     async def _handle_ping(self, msg):
         """Handle ping messages"""
         if msg.get("ping_event", {}).get("event_id"):
-            await self.eleven_labs_ws.send(json.dumps({"type": "pong", "event_id": msg["ping_event"]["event_id"]}))
+            await self.eleven_labs_ws.send(
+                orjson.dumps({"type": "pong", "event_id": msg["ping_event"]["event_id"]}).decode()
+            )
 
     async def _handle_error(self, msg):
         """Handle error messages"""
@@ -248,68 +519,78 @@ class ReminderService:
         """Handle conversation started messages"""
         logger.info("[ElevenLabs] Conversation started successfully")
 
+    # ElevenLabs message type -> handler, built once for the class
+    _HANDLERS = {
+        "audio": _handle_audio_message,
+        "interruption": _handle_interruption,
+        "ping": _handle_ping,
+        "error": _handle_error,
+        "conversation_started": _handle_conversation_started,
+    }
+
     async def handle_call_status(self, to_number, status, agent_id=None):
         """Handle call status updates from Twilio"""
         logger.info("[Twilio] Call status update: %s", status)
         try:
             if status in ["busy", "no-answer", "failed", "canceled"]:
                 if to_number:
-                    self.call_repository.update_ai_call_item(to_number, agent_id, {"stage": status})
+                    _pending_call_statuses[(to_number, agent_id)] = status
         except (ValueError, RuntimeError, ConnectionError) as error:
             logger.error("[Twilio] Error handling call status: %s", error)
 
-    async def keep_alive(self):
-        """Sends periodic keepalive pings to ElevenLabs"""
-        while True:
-            try:
-                if self.eleven_labs_ws and not self.eleven_labs_ws.closed:
-                    await self.eleven_labs_ws.send(json.dumps({"type": "ping"}))
-                    logger.info("[ElevenLabs] Sent keepalive ping")
-                    await asyncio.sleep(30)
-            except (websockets.exceptions.WebSocketException, ConnectionError, RuntimeError) as error:
-                logger.error("[ElevenLabs] Keepalive error: %s", error)
-                break
-
     async def setup_connection(self, custom_parameters):
         """Sets up the ElevenLabs WebSocket connection"""
         try:
-            signed_url = await self.get_signed_url(custom_parameters)
-            logger.info("[ElevenLabs] Got signed URL: %s", signed_url)
-
             try:
-                self.eleven_labs_ws = await websockets.connect(signed_url, ping_interval=20, ping_timeout=60)
-                logger.info("[ElevenLabs] Connected to websocket")
-
-                # Listen for the initial metadata message
-                initial_message = await self.eleven_labs_ws.recv()
-                metadata = json.loads(initial_message)
-
-                if metadata["type"] == "conversation_initiation_metadata":
-                    logger.info("[ElevenLabs] Received metadata: %s", metadata)
-                    self.conversation_id = metadata["conversation_initiation_metadata_event"]["conversation_id"]
-                    self.call_repository.update_ai_call_item(
-                        custom_parameters.get("calling_to"),
-                        custom_parameters.get("agent_id"),
-                        {"conversation_id": self.conversation_id}
-                    )
-
+                self.eleven_labs_ws, self.conversation_id = await self._open_elevenlabs_connection(
+                    custom_parameters.get("agent_id")
+                )
             except websockets.exceptions.WebSocketException as error:
                 logger.error("[ElevenLabs] WebSocket connection failed: %s", error)
                 raise
 
+            if self.conversation_id:
+                await asyncio.to_thread(
+                    self.call_repository.update_ai_call_item,
+                    custom_parameters.get("calling_to"),
+                    custom_parameters.get("agent_id"),
+                    {"conversation_id": self.conversation_id}
+                )
+
             await self._send_initial_config(custom_parameters)
             self.eleven_labs_task = asyncio.create_task(self.handle_eleven_labs_messages())
             logger.info("[ElevenLabs] Message handling task created")
 
         except Exception as error:
             logger.error("[ElevenLabs] Setup error: %s", error)
-            self.call_repository.update_ai_call_item(
+            await asyncio.to_thread(
+                self.call_repository.update_ai_call_item,
                 custom_parameters.get("calling_to"),
                 custom_parameters.get("agent_id"),
                 {"stage": CALL_STATUS["call_failed"]},
             )
             raise
 
+    @classmethod
+    async def _open_elevenlabs_connection(cls, agent_id):
+        """Opens an ElevenLabs conversation websocket and reads its initiation metadata"""
+        signed_url = await cls.get_signed_url({"agent_id": agent_id})
+        logger.info("[ElevenLabs] Got signed URL: %s", signed_url)
+
+        eleven_labs_ws = await websockets.connect(signed_url, ping_interval=20, ping_timeout=60)
+        logger.info("[ElevenLabs] Connected to websocket")
+
+        # Listen for the initial metadata message
+        conversation_id = None
+        initial_message = await eleven_labs_ws.recv()
+        metadata = json.loads(initial_message)
+
+        if metadata["type"] == "conversation_initiation_metadata":
+            logger.info("[ElevenLabs] Received metadata: %s", metadata)
+            conversation_id = metadata["conversation_initiation_metadata_event"]["conversation_id"]
+
+        return eleven_labs_ws, conversation_id
+
     async def _send_initial_config(self, custom_parameters):
         """Sends initial configuration to ElevenLabs"""
         initial_config = {
@@ -327,14 +608,60 @@ class ReminderService:
         logger.info("[ElevenLabs] Initial config sent successfully")
 
     async def handle_media(self, payload):
-        """Handles incoming media from Twilio"""
-        logger.info("[Twilio] Received audio from user")
-        audio_message = {"user_audio_chunk": base64.b64encode(base64.b64decode(payload)).decode()}
-        await self.eleven_labs_ws.send(json.dumps(audio_message))
-        logger.info("[Twilio] Sent audio to ElevenLabs")
+        """Buffers incoming media from Twilio for batched delivery to ElevenLabs"""
+        logger.debug("[Twilio] Received audio from user")
+        self._audio_payloads.append(payload)
+
+        if len(self._audio_payloads) >= AUDIO_BATCH_FRAMES:
+            await self._flush_audio()
+        elif self._audio_flush_handle is None:
+            self._audio_flush_handle = asyncio.get_running_loop().call_later(
+                AUDIO_FLUSH_DELAY, self._schedule_audio_flush
+            )
+
+    def _schedule_audio_flush(self):
+        """Timer callback that flushes audio buffered since the first pending frame"""
+        self._audio_flush_handle = None
+        self._audio_flush_task = asyncio.create_task(self._flush_audio_safely())
+
+    async def _flush_audio_safely(self):
+        try:
+            await self._flush_audio()
+        except (websockets.exceptions.WebSocketException, ConnectionError, RuntimeError) as error:
+            logger.error("[Twilio] Error sending buffered audio to ElevenLabs: %s", error)
+
+    async def _flush_audio(self):
+        """Sends all buffered audio to ElevenLabs as a single chunk"""
+        if self._audio_flush_handle:
+            self._audio_flush_handle.cancel()
+            self._audio_flush_handle = None
+        if not self._audio_payloads:
+            return
+
+        payloads = self._audio_payloads
+        self._audio_payloads = []
+
+        # Twilio payloads are already base64; a lone frame is forwarded untouched. Padded
+        # base64 strings cannot be concatenated, so a batch is re-encoded as one chunk.
+        if len(payloads) == 1:
+            chunk = payloads[0]
+        else:
+            chunk = base64.b64encode(b"".join(map(base64.b64decode, payloads))).decode()
+
+        # base64 needs no JSON escaping, so the envelope is spliced rather than serialized
+        await self.eleven_labs_ws.send(USER_AUDIO_MESSAGE % chunk)
+        logger.debug("[Twilio] Sent audio to ElevenLabs")
 
     async def cleanup(self):
         """Cleans up WebSocket connections and tasks"""
+        if self._audio_flush_handle:
+            self._audio_flush_handle.cancel()
+            self._audio_flush_handle = None
+        if self._audio_flush_task:
+            self._audio_flush_task.cancel()
+            await asyncio.gather(self._audio_flush_task, return_exceptions=True)
+            self._audio_flush_task = None
+
         if self.eleven_labs_ws:
             if self.conversation_id:
                 logger.info("[ElevenLabs] Cleaning up conversation ID: %s", self.conversation_id)
@@ -347,14 +674,11 @@ class ReminderService:
                 except asyncio.CancelledError:
                     pass
 
-    def get_elevenlabs_conversation_analysis(self, conversation_id):
+    async def get_elevenlabs_conversation_analysis(self, conversation_id):
         """Fetches conversation details from ElevenLabs API"""
         logger.info("[ElevenLabs] Fetching conversation details for conversation ID: %s", conversation_id)
         try:
-            response = httpx.Client().get(
-                f"https://api.elevenlabs.io/v1/convai/conversations/{conversation_id}",
-                headers={"xi-api-key": settings.elevenlabs_api_key},
-            )
+            response = await _http.get(f"/v1/convai/conversations/{conversation_id}")
             response.raise_for_status()
             json_response = response.json()
             logger.info("[ElevenLabs] Conversation details: %s", json_response)
@@ -399,22 +723,39 @@ class ReminderService:
             logger.error("[ElevenLabs] Data processing error fetching conversation details: %s", error)
             return {}
 
-    async def get_signed_url(self, custom_parameters):
+    @classmethod
+    async def get_signed_url(cls, custom_parameters):
         """Helper function to get signed URL for authenticated conversations"""
+        agent_id = custom_parameters.get("agent_id")
+        cached = cls._signed_url_cache.get(agent_id)
+        if cached and time.monotonic() - cached[1] < SIGNED_URL_TTL:
+            return cached[0]
+
         try:
-            async with httpx.AsyncClient() as client:
-                logger.info("[ElevenLabs] Agent ID from custom parameters: %s", custom_parameters.get("agent_id"))
-                response = await client.get(
-                    f"https://api.elevenlabs.io/v1/convai/conversation/get_signed_url?agent_id={custom_parameters.get('agent_id')}",
-                    headers={"xi-api-key": settings.elevenlabs_api_key},
-                )
-                response.raise_for_status()
-                data = response.json()
-                return data["signed_url"]
+            logger.info("[ElevenLabs] Agent ID from custom parameters: %s", agent_id)
+            response = await _http.get(
+                "/v1/convai/conversation/get_signed_url",
+                params={"agent_id": agent_id},
+            )
+            response.raise_for_status()
+            data = response.json()
+            cls._signed_url_cache[agent_id] = (data["signed_url"], time.monotonic())
+            return data["signed_url"]
         except Exception as error:
             logger.error("Error getting signed URL: %s", error)
             raise
 
+    async def _fetch_call_criteria(self, conversation_id, semaphore):
+        """Fetches the ElevenLabs analysis for one conversation"""
+        async with semaphore:
+            try:
+                return await self.get_elevenlabs_conversation_analysis(conversation_id)
+            except (httpx.HTTPError, json.JSONDecodeError, KeyError, ValueError) as error:
+                logger.error(
+                    "Error fetching ElevenLabs details for conversation %s: %s", conversation_id, str(error)
+                )
+                return {}
+
     async def update_recent_call_records(self) -> list:
         """
         Update AI calling records from the last 20 minutes with ElevenLabs conversation analysis
@@ -423,19 +764,35 @@ class ReminderService:
             list: List of updated call records
         """
         try:
-            call_repository = CallRepository(dynamodb)
-            records = call_repository.get_recent_calls(minutes=200)
+            records = await asyncio.to_thread(call_repository.get_recent_calls, minutes=200)
             logger.info("Retrieved records: %s", records)
 
-            for record in records:
-                if conversation_id := record.get("conversation_id"):
-                    try:
-                        call_feedback = self.get_elevenlabs_conversation_analysis(conversation_id)
-                        call_repository.update_call_criteria_record(conversation_id, call_feedback)
-                    except (httpx.HTTPError, json.JSONDecodeError, KeyError, ValueError) as error:
-                        logger.error(
-                            "Error fetching ElevenLabs details for conversation %s: %s", conversation_id, str(error)
-                        )
+            # Records are independent, so refresh them concurrently within the HTTP pool size
+            semaphore = asyncio.Semaphore(ANALYSIS_CONCURRENCY)
+            conversation_ids = [
+                conversation_id
+                for record in records
+                if (conversation_id := record.get("conversation_id")) and conversation_id != "nil"
+            ]
+            feedbacks = await asyncio.gather(
+                *(
+                    self._fetch_call_criteria(conversation_id, semaphore)
+                    for conversation_id in conversation_ids
+                ),
+                return_exceptions=True,
+            )
+            updates = []
+            for conversation_id, call_feedback in zip(conversation_ids, feedbacks):
+                if isinstance(call_feedback, Exception):
+                    logger.error("Error fetching criteria for conversation %s: %s", conversation_id, call_feedback)
+                elif call_feedback:
+                    updates.append((conversation_id, call_feedback))
+
+            # Write every fetched analysis in one pass over the repository's update pool
+            results = await asyncio.to_thread(call_repository.batch_update_call_criteria, updates)
+            for (conversation_id, _), result in zip(updates, results):
+                if result is not None:
+                    logger.error("Error updating criteria for conversation %s: %s", conversation_id, result)
 
             logger.info("Updated %d records from the last 20 minutes", len(records))
             return records
@@ -451,14 +808,21 @@ class ReminderService:
         Returns:
             list: List of agent objects containing their details
         """
+        if (agents := _agents_cache.get("agents")) is not None:
+            return agents
+
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    "https://api.elevenlabs.io/v1/convai/agents",
-                    headers={"xi-api-key": settings.elevenlabs_api_key},
-                )
-                response.raise_for_status()
-                return response.json()
+            response = await _http.get("/v1/convai/agents")
+            response.raise_for_status()
+            agents = response.json()
+            _agents_cache["agents"] = agents
+            return agents
         except Exception as error:
             logger.error("[ElevenLabs] Error fetching agents list: %s", error)
-            raise
\ No newline at end of file
+            raise
+
+    @staticmethod
+    def invalidate_elevenlabs_agents_cache():
+        """Drops the cached ElevenLabs agent list so the next request refetches it"""
+        _agents_cache.pop("agents", None)
+        logger.info("[ElevenLabs] Agents cache invalidated")
\ No newline at end of file
@@ -1,4 +1,5 @@
 import boto3
+from botocore.config import Config
 from config import settings
 
 # Initialize DynamoDB client
@@ -6,5 +7,7 @@ dynamodb = boto3.resource(
     'dynamodb',
     region_name=settings.aws_region,
     aws_access_key_id=settings.aws_access_key_id,
-    aws_secret_access_key=settings.aws_secret_access_key
+    aws_secret_access_key=settings.aws_secret_access_key,
+    # Enough pooled connections for the concurrent criteria updates
+    config=Config(max_pool_connections=20),
 )
\ No newline at end of file
@@ -1,6 +1,8 @@
+import atexit
 import logging
+import queue
 import sys
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 import os
 
 # Get the absolute path to the project root directory
@@ -23,7 +25,6 @@ formatter = logging.Formatter(
 # Console Handler (for all logs)
 console_handler = logging.StreamHandler(sys.stdout)
 console_handler.setFormatter(formatter)
-logger.addHandler(console_handler)
 
 # File Handler for all logs
 file_handler = RotatingFileHandler(
@@ -33,4 +34,12 @@ file_handler = RotatingFileHandler(
 )
 file_handler.setLevel(logging.INFO)
 file_handler.setFormatter(formatter)
-logger.addHandler(file_handler)
\ No newline at end of file
+
+# Log calls only enqueue records; a listener thread does the console and file I/O
+# so logging never blocks the event loop
+log_queue = queue.Queue(-1)
+logger.addHandler(QueueHandler(log_queue))
+
+queue_listener = QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+queue_listener.start()
+atexit.register(queue_listener.stop)
\ No newline at end of file
@@ -1,9 +1,37 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from app.modules.api import router
+from app.modules.ai_client import close_twilio_client, start_twilio_client
+from app.modules.services import (
+    close_http_client,
+    flush_call_statuses,
+    run_call_status_flusher,
+    run_reports_cache_purge,
+    start_http_client,
+)
 from fastapi.middleware.cors import CORSMiddleware
+import asyncio
 import uvicorn
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await start_http_client()
+    await start_twilio_client()
+    background_tasks = [
+        asyncio.create_task(run_call_status_flusher()),
+        asyncio.create_task(run_reports_cache_purge()),
+    ]
+    yield
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    # Write out anything buffered since the last tick
+    await flush_call_statuses()
+    await close_http_client()
+    await close_twilio_client()
+
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -18,4 +46,4 @@ app.add_middleware(
 app.include_router(router)
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)